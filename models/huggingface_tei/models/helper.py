@@ -28,6 +28,13 @@ class TeiModelExtraParameter:
 cache = {}
 cache_lock = Lock()
 
+# Shared client for the invoke_* endpoints, so consecutive (and concurrent)
+# batches reuse pooled keep-alive connections instead of paying a TCP/TLS
+# handshake per request. Timeouts are still passed per request.
+_client = httpx.Client(
+    limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+)
+
 
 class TeiHelper:
     @staticmethod
@@ -140,7 +147,7 @@ class TeiHelper:
 
         for attempt in range(max_retries + 1):
             try:
-                resp = httpx.post(url, json=json_data, headers=headers, timeout=invoke_timeout)
+                resp = _client.post(url, json=json_data, headers=headers, timeout=invoke_timeout)
                 resp.raise_for_status()
                 break
             except (httpx.RequestError, httpx.HTTPStatusError) as e:
@@ -185,7 +192,7 @@ class TeiHelper:
 
         for attempt in range(max_retries + 1):
             try:
-                resp = httpx.post(url, json=json_data, headers=headers, timeout=invoke_timeout)
+                resp = _client.post(url, json=json_data, headers=headers, timeout=invoke_timeout)
                 resp.raise_for_status()
                 break
             except (httpx.RequestError, httpx.HTTPStatusError) as e:
@@ -221,7 +228,7 @@ class TeiHelper:
 
         for attempt in range(max_retries + 1):
             try:
-                resp = httpx.post(url, json=json_data, headers=headers, timeout=invoke_timeout)
+                resp = _client.post(url, json=json_data, headers=headers, timeout=invoke_timeout)
                 resp.raise_for_status()
                 break
             except (httpx.RequestError, httpx.HTTPStatusError) as e:
@@ -1,5 +1,15 @@
+import os
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from decimal import ROUND_HALF_UP, Decimal
+from functools import lru_cache
+from hashlib import blake2b
+from operator import itemgetter
 from typing import Optional
+
+import httpx
+import numpy as np
+from tokenizers import Tokenizer
 from dify_plugin.entities.model import (
     AIModelEntity,
     EmbeddingInputType,
@@ -27,6 +37,47 @@ from models.helper import TeiHelper
 
 DEFAULT_MAX_RETRIES = 3
 DEFAULT_INVOKE_TIMEOUT = 60
+DEFAULT_MAX_CONCURRENCY = 8
+
+
+@lru_cache(maxsize=1)
+def _get_gpt2_tokenizer() -> Tokenizer:
+    """
+    Lazily load the Rust-backed GPT2 tokenizer, shared by all instances.
+    """
+    return Tokenizer.from_pretrained("gpt2")
+
+
+# Token counts cached by content digest, so repeated texts (re-index runs,
+# boilerplate chunks, validation pings) skip re-tokenization. Keys are short
+# blake2b digests; the cache is cleared wholesale once it reaches maxsize to
+# keep memory bounded on large indexing jobs.
+TOKEN_CACHE_MAXSIZE = int(os.environ.get("TEI_TOKEN_CACHE_MAXSIZE", "100000"))
+_token_len_cache: dict[bytes, int] = {}
+
+
+def _batch_token_lengths(texts: list[str]) -> list[int]:
+    """
+    Return the GPT2 token count of each text, tokenizing only unseen texts.
+    """
+    lengths: list[Optional[int]] = [None] * len(texts)
+    digests = [blake2b(text.encode("utf-8"), digest_size=16).digest() for text in texts]
+    miss_indices = []
+    for i, digest in enumerate(digests):
+        cached = _token_len_cache.get(digest)
+        if cached is None:
+            miss_indices.append(i)
+        else:
+            lengths[i] = cached
+    if miss_indices:
+        encodings = _get_gpt2_tokenizer().encode_batch(
+            [texts[i] for i in miss_indices], add_special_tokens=False
+        )
+        if len(_token_len_cache) + len(miss_indices) > TOKEN_CACHE_MAXSIZE:
+            _token_len_cache.clear()
+        for i, encoding in zip(miss_indices, encodings):
+            lengths[i] = _token_len_cache[digests[i]] = len(encoding.ids)
+    return lengths
 
 
 class HuggingfaceTeiTextEmbeddingModel(TextEmbeddingModel):
@@ -62,47 +113,138 @@ class HuggingfaceTeiTextEmbeddingModel(TextEmbeddingModel):
         server_url = server_url.removesuffix("/")
         max_retries = int(credentials.get("max_retries") or DEFAULT_MAX_RETRIES)
         invoke_timeout = int(credentials.get("invoke_timeout") or DEFAULT_INVOKE_TIMEOUT)
+        max_concurrency = int(credentials.get("max_concurrency") or DEFAULT_MAX_CONCURRENCY)
         headers = {"Content-Type": "application/json"}
         api_key = credentials.get("api_key")
         if api_key:
             headers["Authorization"] = f"Bearer {api_key}"
         context_size = self._get_context_size(model, credentials)
         max_chunks = self._get_max_chunks(model, credentials)
+        # RAG corpora commonly repeat chunks (boilerplate headers, titles);
+        # embed each distinct text once and fan the vectors back out to the
+        # original positions at the end
+        unique_positions: dict[str, int] = {}
+        mapping = [unique_positions.setdefault(text, len(unique_positions)) for text in texts]
+        unique_texts = list(unique_positions)
+
         inputs = []
-        indices = []
+        num_tokens_list = []
         used_tokens = 0
-        
-        # Use GPT2 tokenizer instead of server's /tokenize endpoint
-        for i, text in enumerate(texts):
-            num_tokens = self._get_num_tokens_by_gpt2(text)
-            if num_tokens >= context_size:
-                # If text is too long, truncate it based on character length ratio
-                cutoff = int(len(text) * (context_size / num_tokens))
-                inputs.append(text[0:cutoff])
-            else:
-                inputs.append(text)
-            indices += [i]
+
+        # Use GPT2 tokenizer instead of server's /tokenize endpoint; token
+        # counts come from the digest-keyed cache, missing texts are encoded
+        # in one Rust-side batch call
+        token_lengths = _batch_token_lengths(unique_texts)
+
+        # If texts are too long, truncate them on token ids and decode back;
+        # a character-length ratio misjudges multi-byte scripts and either
+        # re-sends oversize inputs or wastes context. Only over-long texts are
+        # re-encoded, in a single Rust-side batch call.
+        overlong_indices = [i for i, num_tokens in enumerate(token_lengths) if num_tokens >= context_size]
+        truncated: dict[int, tuple[str, int]] = {}
+        if overlong_indices:
+            tokenizer = _get_gpt2_tokenizer()
+            encodings = tokenizer.encode_batch(
+                [unique_texts[i] for i in overlong_indices], add_special_tokens=False
+            )
+            for i, encoding in zip(overlong_indices, encodings):
+                truncated_ids = encoding.ids[: context_size - 1]
+                truncated[i] = (tokenizer.decode(truncated_ids), len(truncated_ids))
+
+        for i, text in enumerate(unique_texts):
+            num_tokens = token_lengths[i]
+            if i in truncated:
+                text, num_tokens = truncated[i]
+            inputs.append(text)
+            num_tokens_list.append(num_tokens)
             used_tokens += num_tokens
-            
-        batched_embeddings = []
-        _iter = range(0, len(inputs), max_chunks)
+
+        # Batch over inputs sorted by token length (longest first): the server
+        # pads every batch to its longest member, so length-homogeneous batches
+        # waste fewer padded token-positions. Batches are packed by total token
+        # count rather than text count alone, so a batch of long texts does not
+        # carry max_chunks times more server compute than a batch of short
+        # ones. Embeddings are scattered back to their original positions as
+        # each batch completes.
+        token_budget = int(credentials.get("max_batch_tokens") or max_chunks * context_size // 4)
+        order = sorted(range(len(inputs)), key=lambda index: -num_tokens_list[index])
+        batches: list[list[int]] = []
+        current_batch: list[int] = []
+        current_tokens = 0
+        for index in order:
+            if current_batch and (
+                len(current_batch) >= max_chunks or current_tokens + num_tokens_list[index] > token_budget
+            ):
+                batches.append(current_batch)
+                current_batch = []
+                current_tokens = 0
+            current_batch.append(index)
+            current_tokens += num_tokens_list[index]
+        if current_batch:
+            batches.append(current_batch)
+        # Collect rows into one preallocated float32 matrix rather than a list
+        # of Python-float lists: 4 bytes per value instead of a boxed PyFloat,
+        # and contiguous rows for any downstream vector math. The matrix is
+        # allocated once the first completed batch reveals the dimension.
+        embedding_matrix: Optional[np.ndarray] = None
         try:
-            for i in _iter:
-                iter_texts = inputs[i : i + max_chunks]
-                results = TeiHelper.invoke_embeddings(server_url, iter_texts, headers, invoke_timeout, max_retries)
-                embeddings = results["data"]
-                embeddings = [embedding["embedding"] for embedding in embeddings]
-                batched_embeddings.extend(embeddings)
+            # Submit batches concurrently, so N batches cost roughly one HTTP
+            # round-trip instead of N serial ones. Retries stay per-batch
+            # inside TeiHelper.invoke_embeddings.
+            with ThreadPoolExecutor(max_workers=min(max_concurrency, len(batches)) or 1) as executor:
+                futures = {
+                    executor.submit(
+                        self._embed_batch,
+                        server_url,
+                        [inputs[index] for index in batch],
+                        headers,
+                        invoke_timeout,
+                        max_retries,
+                    ): batch
+                    for batch in batches
+                }
+                for future in as_completed(futures):
+                    rows = np.asarray(future.result(), dtype=np.float32)
+                    if embedding_matrix is None:
+                        embedding_matrix = np.empty((len(inputs), rows.shape[1]), dtype=np.float32)
+                    embedding_matrix[futures[future]] = rows
         except RuntimeError as e:
             raise InvokeServerUnavailableError(str(e))
         usage = self._calc_response_usage(
             model=model, credentials=credentials, tokens=used_tokens
         )
         result = TextEmbeddingResult(
-            model=model, embeddings=batched_embeddings, usage=usage
+            model=model,
+            # TextEmbeddingResult expects plain lists; the fancy index fans the
+            # unique rows back out to the original (possibly duplicated) order
+            embeddings=embedding_matrix[mapping].tolist() if embedding_matrix is not None else [],
+            usage=usage,
         )
         return result
 
+    def _embed_batch(
+        self,
+        server_url: str,
+        batch_texts: list[str],
+        headers: dict,
+        invoke_timeout: int,
+        max_retries: int,
+    ) -> list[list[float]]:
+        """
+        Embed one batch, halving it on server errors that suggest the TEI
+        server ran out of memory on the padded batch.
+        """
+        try:
+            results = TeiHelper.invoke_embeddings(server_url, batch_texts, headers, invoke_timeout, max_retries)
+        except httpx.HTTPStatusError as e:
+            if len(batch_texts) > 1 and (e.response.status_code == 413 or e.response.status_code >= 500):
+                mid = len(batch_texts) // 2
+                return self._embed_batch(
+                    server_url, batch_texts[:mid], headers, invoke_timeout, max_retries
+                ) + self._embed_batch(server_url, batch_texts[mid:], headers, invoke_timeout, max_retries)
+            raise
+        return list(map(itemgetter("embedding"), results["data"]))
+
     def get_num_tokens(self, model: str, credentials: dict, texts: list[str]) -> list[int]:
         """
         Get number of tokens for given prompt messages using GPT2 tokenizer
@@ -112,10 +254,7 @@ class HuggingfaceTeiTextEmbeddingModel(TextEmbeddingModel):
         :param texts: texts to embed
         :return: list of token counts
         """
-        tokens = []
-        for text in texts:
-            tokens.append(self._get_num_tokens_by_gpt2(text))
-        return tokens
+        return _batch_token_lengths(texts)
 
     def validate_credentials(self, model: str, credentials: dict) -> None:
         """
@@ -126,20 +265,22 @@ class HuggingfaceTeiTextEmbeddingModel(TextEmbeddingModel):
         :return:
         """
         try:
-            server_url = credentials["server_url"]
+            server_url = credentials["server_url"].removesuffix("/")
             headers = {"Content-Type": "application/json"}
             api_key = credentials.get("api_key")
             if api_key:
                 headers["Authorization"] = f"Bearer {api_key}"
             extra_args = TeiHelper.get_tei_extra_parameter(server_url, model, headers)
-            print(extra_args)
             if extra_args.model_type != "embedding":
                 raise CredentialsValidateFailedError(
                     "Current model is not a embedding model"
                 )
             credentials["context_size"] = extra_args.max_input_length
             credentials["max_chunks"] = extra_args.max_client_batch_size
-            self._invoke(model=model, credentials=credentials, texts=["ping"])
+            # A single-token embed is enough as a liveness check; calling
+            # _invoke here would walk the full tokenization and usage path
+            # (and load the GPT2 tokenizer) on every credential save
+            TeiHelper.invoke_embeddings(server_url, ["."], headers, invoke_timeout=5, max_retries=1)
         except Exception as ex:
             raise CredentialsValidateFailedError(str(ex))
 
@@ -164,18 +305,28 @@ class HuggingfaceTeiTextEmbeddingModel(TextEmbeddingModel):
         :param tokens: input tokens
         :return: usage
         """
-        input_price_info = self.get_price(
-            model=model,
-            credentials=credentials,
-            price_type=PriceType.INPUT,
-            tokens=tokens,
+        # Unit price is immutable per model, so resolve it once per instance
+        # and only scale by the token count on subsequent invokes
+        price_cache = getattr(self, "_unit_price_cache", None)
+        if price_cache is None:
+            price_cache = self._unit_price_cache = {}
+        input_price_info = price_cache.get((model, PriceType.INPUT))
+        if input_price_info is None:
+            input_price_info = price_cache[(model, PriceType.INPUT)] = self.get_price(
+                model=model,
+                credentials=credentials,
+                price_type=PriceType.INPUT,
+                tokens=1,
+            )
+        total_price = (input_price_info.unit_price * input_price_info.unit * tokens).quantize(
+            Decimal("0.0000001"), rounding=ROUND_HALF_UP
         )
         usage = EmbeddingUsage(
             tokens=tokens,
             total_tokens=tokens,
             unit_price=input_price_info.unit_price,
             price_unit=input_price_info.unit,
-            total_price=input_price_info.total_amount,
+            total_price=total_price,
             currency=input_price_info.currency,
             latency=time.perf_counter() - self.started_at,
         )
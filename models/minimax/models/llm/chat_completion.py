@@ -1,7 +1,8 @@
 from collections.abc import Generator
-from json import dumps, loads
 from typing import Any, Union
-from requests import Response, post
+
+import httpx
+import orjson
 from models.llm.errors import (
     BadRequestError,
     InsufficientAccountBalanceError,
@@ -12,6 +13,29 @@ from models.llm.errors import (
 )
 from models.llm.types import MinimaxMessage
 
+DATA_PREFIX = b"data: "
+
+# Shared client so successive chat turns reuse pooled keep-alive connections
+# (multiplexed over one connection where the server speaks HTTP/2) instead of
+# paying a TCP+TLS handshake per request
+_client = httpx.Client(
+    http2=True,
+    timeout=httpx.Timeout(300.0, connect=10.0),
+    limits=httpx.Limits(max_keepalive_connections=16, max_connections=32),
+)
+
+_CODE_TO_ERROR = {
+    1000: InternalServerError,
+    1001: InternalServerError,
+    1013: InternalServerError,
+    1027: InternalServerError,
+    1002: RateLimitReachedError,
+    1039: RateLimitReachedError,
+    1004: InvalidAuthenticationError,
+    1008: InsufficientAccountBalanceError,
+    2013: BadRequestError,
+}
+
 
 class MinimaxChatCompletion:
     """
@@ -57,7 +81,7 @@ class MinimaxChatCompletion:
             prompt_messages = prompt_messages[1:]
         if len(prompt_messages) == 0:
             raise BadRequestError("At least one user message is required")
-        messages = [message.to_completion_dict() for message in prompt_messages]
+        messages = [message.completion_dict for message in prompt_messages]
         headers = {"Authorization": "Bearer " + api_key, "Content-Type": "application/json"}
         body = {
             "model": model,
@@ -68,72 +92,94 @@ class MinimaxChatCompletion:
             **extra_kwargs,
         }
         try:
-            response = post(url=url, data=dumps(body), headers=headers, stream=stream, timeout=(10, 300))
+            if stream:
+                request = _client.build_request("POST", url, content=orjson.dumps(body), headers=headers)
+                response = _client.send(request, stream=True)
+            else:
+                response = _client.post(url, content=orjson.dumps(body), headers=headers)
         except Exception as e:
             raise InternalServerError(e)
         if response.status_code != 200:
+            if stream:
+                response.read()
+                response.close()
             raise InternalServerError(response.text)
         if stream:
             return self._handle_stream_chat_generate_response(response)
         return self._handle_chat_generate_response(response)
 
     def _handle_error(self, code: int, msg: str):
-        if code in {1000, 1001, 1013, 1027}:
-            raise InternalServerError(msg)
-        elif code in {1002, 1039}:
-            raise RateLimitReachedError(msg)
-        elif code == 1004:
-            raise InvalidAuthenticationError(msg)
-        elif code == 1008:
-            raise InsufficientAccountBalanceError(msg)
-        elif code == 2013:
-            raise BadRequestError(msg)
-        else:
-            raise InternalServerError(msg)
+        raise _CODE_TO_ERROR.get(code, InternalServerError)(msg)
 
-    def _handle_chat_generate_response(self, response: Response) -> MinimaxMessage:
+    def _handle_chat_generate_response(self, response: httpx.Response) -> MinimaxMessage:
         """
         handle chat generate response
         """
-        response = response.json()
-        if "base_resp" in response and response["base_resp"]["status_code"] != 0:
-            code = response["base_resp"]["status_code"]
-            msg = response["base_resp"]["status_msg"]
+        response_json = orjson.loads(response.content)
+        if "base_resp" in response_json and response_json["base_resp"]["status_code"] != 0:
+            code = response_json["base_resp"]["status_code"]
+            msg = response_json["base_resp"]["status_msg"]
             self._handle_error(code, msg)
-        message = MinimaxMessage(content=response["reply"], role=MinimaxMessage.Role.ASSISTANT.value)
+        message = MinimaxMessage(content=response_json["reply"], role=MinimaxMessage.Role.ASSISTANT.value)
         message.usage = {
             "prompt_tokens": 0,
-            "completion_tokens": response["usage"]["total_tokens"],
-            "total_tokens": response["usage"]["total_tokens"],
+            "completion_tokens": response_json["usage"]["total_tokens"],
+            "total_tokens": response_json["usage"]["total_tokens"],
         }
-        message.stop_reason = response["choices"][0]["finish_reason"]
+        message.stop_reason = response_json["choices"][0]["finish_reason"]
         return message
 
-    def _handle_stream_chat_generate_response(self, response: Response) -> Generator[MinimaxMessage, None, None]:
+    @staticmethod
+    def _iter_sse_lines(response: httpx.Response) -> Generator[bytes, None, None]:
+        """
+        Yield bytes lines from a streamed response; httpx's own iter_lines
+        decodes to str, which the byte-level SSE parsing below avoids.
+        iter_bytes (not iter_raw) keeps Content-Encoding decompression, so a
+        gzipped stream still yields parseable lines.
+        """
+        buffer = b""
+        for chunk in response.iter_bytes():
+            buffer += chunk
+            while (newline := buffer.find(b"\n")) != -1:
+                yield buffer[:newline].rstrip(b"\r")
+                buffer = buffer[newline + 1 :]
+        if buffer:
+            yield buffer
+
+    def _handle_stream_chat_generate_response(self, response: httpx.Response) -> Generator[MinimaxMessage, None, None]:
         """
         handle stream chat generate response
         """
-        for line in response.iter_lines():
-            if not line:
-                continue
-            line: str = line.decode("utf-8")
-            if line.startswith("data: "):
-                line = line[6:].strip()
-            data = loads(line)
-            if "base_resp" in data and data["base_resp"]["status_code"] != 0:
-                code = data["base_resp"]["status_code"]
-                msg = data["base_resp"]["status_msg"]
-                self._handle_error(code, msg)
-            if data["reply"]:
-                total_tokens = data["usage"]["total_tokens"]
-                message = MinimaxMessage(role=MinimaxMessage.Role.ASSISTANT.value, content="")
-                message.usage = {"prompt_tokens": 0, "completion_tokens": total_tokens, "total_tokens": total_tokens}
-                message.stop_reason = data["choices"][0]["finish_reason"]
-                yield message
-                return
-            choices = data.get("choices", [])
-            if len(choices) == 0:
-                continue
-            for choice in choices:
-                message = choice["delta"]
-                yield MinimaxMessage(content=message, role=MinimaxMessage.Role.ASSISTANT.value)
+        # Close the response as soon as the generator finishes (or is dropped)
+        # so the connection goes back to the keep-alive pool immediately
+        # instead of waiting for GC to drain it
+        try:
+            # Work on raw bytes: skip the per-line UTF-8 decode and strip the
+            # SSE prefix with a zero-copy memoryview slice; orjson parses
+            # straight from the buffer
+            for line in self._iter_sse_lines(response):
+                if not line:
+                    continue
+                view = memoryview(line)
+                if view[:6] == DATA_PREFIX:
+                    view = view[6:]
+                data = orjson.loads(view)
+                if "base_resp" in data and data["base_resp"]["status_code"] != 0:
+                    code = data["base_resp"]["status_code"]
+                    msg = data["base_resp"]["status_msg"]
+                    self._handle_error(code, msg)
+                if data["reply"]:
+                    total_tokens = data["usage"]["total_tokens"]
+                    message = MinimaxMessage(role=MinimaxMessage.Role.ASSISTANT.value, content="")
+                    message.usage = {"prompt_tokens": 0, "completion_tokens": total_tokens, "total_tokens": total_tokens}
+                    message.stop_reason = data["choices"][0]["finish_reason"]
+                    yield message
+                    return
+                choices = data.get("choices", [])
+                if len(choices) == 0:
+                    continue
+                for choice in choices:
+                    message = choice["delta"]
+                    yield MinimaxMessage(content=message, role=MinimaxMessage.Role.ASSISTANT.value)
+        finally:
+            response.close()
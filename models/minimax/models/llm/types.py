@@ -1,4 +1,5 @@
 from enum import Enum
+from functools import cached_property
 from typing import Any, Optional
 from pydantic import BaseModel, Field
 
@@ -44,15 +45,23 @@ class MinimaxMessage(BaseModel):
                 "content": self.content
             }
 
-    def to_completion_dict(self) -> dict[str, Any]:
+    @cached_property
+    def completion_dict(self) -> dict[str, Any]:
         """
-        Convert to original API format (used by chat_completion.py)
+        Original API format (used by chat_completion.py), built once per
+        message since role and content do not change after construction
         """
         return {
             "sender_type": self.role,
             "text": self.content
         }
 
+    def to_completion_dict(self) -> dict[str, Any]:
+        """
+        Convert to original API format (used by chat_completion.py)
+        """
+        return self.completion_dict
+
     def to_pro_dict(self) -> dict[str, Any]:
         """
         Convert to Pro API format (used by chat_completion_pro.py)